@@ -5,15 +5,14 @@ Serves working SCAP metrics on port 9155
 """
 
 import http.server
-import socketserver
 import sys
 import os
 
 # Add current directory to path to import our exporter
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from scap_prometheus_exporter import SCAPParser, PrometheusExporter
-from prometheus_client import generate_latest, CollectorRegistry
+from scap_prometheus_exporter import SCAPParser, PrometheusExporter, write_metrics
+from prometheus_client import CollectorRegistry
 
 # Global exporter instance
 exporter = None
@@ -23,11 +22,7 @@ class MetricsHandler(http.server.BaseHTTPRequestHandler):
         if self.path == '/metrics':
             try:
                 if exporter:
-                    metrics_output = generate_latest(exporter.registry)
-                    self.send_response(200)
-                    self.send_header('Content-Type', 'text/plain; charset=utf-8')
-                    self.end_headers()
-                    self.wfile.write(metrics_output)
+                    write_metrics(self, exporter)
                 else:
                     self.send_error(503, "Exporter not ready")
             except Exception as e:
@@ -74,7 +69,8 @@ def main():
     print(f"🔍 Health check at: http://localhost:{port}/health")
     print("Press Ctrl+C to stop...")
     
-    with socketserver.TCPServer(("", port), MetricsHandler) as httpd:
+    # ThreadingHTTPServer handles each request on its own daemon thread
+    with http.server.ThreadingHTTPServer(("", port), MetricsHandler) as httpd:
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
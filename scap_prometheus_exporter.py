@@ -4,15 +4,19 @@ SCAP Prometheus Exporter
 A comprehensive solution for exposing SCAP compliance metrics to Prometheus
 """
 
-import xml.etree.ElementTree as ET
 import json
 import time
 import logging
 import argparse
 import subprocess
 import os
+import sys
+import socket
+import signal
 import tempfile
 import hashlib
+import gzip
+import io
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -20,14 +24,66 @@ from dataclasses import dataclass, asdict
 from prometheus_client import CollectorRegistry, Gauge, Counter, Info, generate_latest
 from prometheus_client.core import REGISTRY
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import yaml
 
+try:
+    # lxml (libxml2) parses large SCAP results far faster than the
+    # pure-Python ElementTree; fall back to the stdlib when unavailable
+    from lxml import etree as ET
+    LXML_AVAILABLE = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    LXML_AVAILABLE = False
+
+try:
+    # orjson serializes the /results payload several times faster than json
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Metrics outputs at least this large are sent to scrapers with sendfile()
+SENDFILE_THRESHOLD = 256 * 1024
+
+HEALTH_RESPONSE = b'{"status": "healthy"}'
+
+# __slots__ dataclasses need Python 3.10+; older interpreters keep __dict__
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Failed-rule severity -> index into the per-severity counters; anything
+# else lands in the trailing slot, which is not reported
+_SEV_TO_BUCKET = {sys.intern(severity): bucket for bucket, severity in
+                  enumerate(('high', 'medium', 'low', 'info'))}
+_SEV_UNKNOWN_BUCKET = len(_SEV_TO_BUCKET)
+
+# Rule result -> index into the per-status counters; notselected, fixed and
+# anything unrecognized land in the trailing slot and only count toward total
+_RESULT_TO_COUNTER = {sys.intern(status): counter for counter, status in enumerate((
+    'pass', 'fail', 'error', 'unknown', 'notapplicable', 'notchecked', 'informational'))}
+_RESULT_FAIL = _RESULT_TO_COUNTER['fail']
+_RESULT_UNCOUNTED = len(_RESULT_TO_COUNTER)
+
+# Clark-notation XCCDF tags, built once so the parse loop compares plain
+# strings and never resolves namespace prefixes
+_NS_XCCDF = 'http://checklists.nist.gov/xccdf/1.2'
+(_TAG_BENCHMARK, _TAG_RULE, _TAG_TITLE, _TAG_TEST_RESULT, _TAG_RULE_RESULT,
+ _TAG_RESULT, _TAG_PROFILE, _TAG_TARGET, _TAG_START_TIME) = (
+    sys.intern('{%s}%s' % (_NS_XCCDF, local)) for local in (
+        'Benchmark', 'Rule', 'title', 'TestResult', 'rule-result',
+        'result', 'profile', 'target', 'start-time'))
+
+# Elements lxml's iterparse reports: those the parse loop reads, plus the
+# bulky Benchmark containers so they are still freed as each one ends
+_LXML_STREAMED_TAGS = (
+    _TAG_BENCHMARK, _TAG_RULE, _TAG_TEST_RESULT, _TAG_RULE_RESULT,
+    _TAG_PROFILE, _TAG_TARGET, _TAG_START_TIME,
+) + tuple('{%s}%s' % (_NS_XCCDF, local) for local in ('Profile', 'Group', 'Value'))
+
+@dataclass(**DATACLASS_SLOTS)
 class SCAPResult:
     """Data class for SCAP scan results"""
     hostname: str
@@ -49,133 +105,233 @@ class SCAPResult:
     benchmark_id: str
     benchmark_version: str
     rule_details: List[Dict]
+    
+    @property
+    def failed_by_severity(self) -> Dict[str, int]:
+        """Failed rule counts keyed by severity"""
+        return {
+            'high': self.severity_high_failed,
+            'medium': self.severity_medium_failed,
+            'low': self.severity_low_failed,
+            'info': self.severity_info_failed
+        }
 
 class SCAPParser:
     """Parser for SCAP XML results"""
     
-    def __init__(self):
+    def __init__(self, collect_rule_details: bool = False):
+        # Per-rule details are only needed for the /results endpoint; the
+        # Prometheus metrics are built from the aggregate counters alone
+        self.collect_rule_details = collect_rule_details
         self.namespaces = {
-            'xccdf': 'http://checklists.nist.gov/xccdf/1.2',
+            'xccdf': _NS_XCCDF,
             'oval-res': 'http://oval.mitre.org/XMLSchema/oval-results-5',
             'cpe': 'http://cpe.mitre.org/language/2.0'
         }
+        
+        # lxml parser settings shared by every scan: lift the size limits that
+        # large oscap reports hit, drop whitespace-only text and comments,
+        # skip building the xml:id lookup table nothing here uses, never
+        # expand entities or touch the network, and skip the events of
+        # elements the parse loop has no use for
+        self._iterparse_options = {}
+        if LXML_AVAILABLE:
+            self._iterparse_options = {
+                'huge_tree': True,
+                'remove_blank_text': True,
+                'remove_comments': True,
+                'collect_ids': False,
+                'resolve_entities': False,
+                'no_network': True,
+                'tag': _LXML_STREAMED_TAGS
+            }
     
     def parse_results(self, xml_file: str, hostname: str = None) -> Optional[SCAPResult]:
         """Parse SCAP XML results file"""
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-            
-            # Extract basic info
-            benchmark = root.find('.//xccdf:Benchmark', self.namespaces)
-            if benchmark is None:
-                logger.error("No benchmark found in SCAP results")
-                return None
-            
-            benchmark_id = benchmark.get('id', 'unknown')
-            benchmark_version = benchmark.get('version', 'unknown')
-            
-            # Get profile info - check if root is TestResult or find it
-            if root.tag == '{http://checklists.nist.gov/xccdf/1.2}TestResult':
-                test_result = root
-            else:
-                test_result = root.find('.//xccdf:TestResult', self.namespaces)
-                if test_result is None:
-                    logger.error("No test results found in SCAP results")
-                    return None
+            with open(xml_file, 'rb') as source:
+                return self._parse_stream(source, hostname)
+        except OSError as e:
+            logger.error(f"Error parsing SCAP results: {e}")
+            return None
+    
+    def parse_results_bytes(self, data: bytes, hostname: str = None) -> Optional[SCAPResult]:
+        """Parse SCAP XML results already held in memory"""
+        return self._parse_stream(io.BytesIO(data), hostname)
+    
+    def _parse_stream(self, source, hostname: str = None) -> Optional[SCAPResult]:
+        """Parse SCAP XML results from a binary file object"""
+        try:
+            # Tags bound to locals: the loop below compares them per element
+            benchmark_tag = _TAG_BENCHMARK
+            rule_tag = _TAG_RULE
+            test_result_tag = _TAG_TEST_RESULT
+            rule_result_tag = _TAG_RULE_RESULT
+            profile_tag = _TAG_PROFILE
+            target_tag = _TAG_TARGET
+            start_time_tag = _TAG_START_TIME
+            result_tag = _TAG_RESULT
+            title_tag = _TAG_TITLE
             
-            profile_elem = test_result.find('xccdf:profile', self.namespaces)
-            profile = profile_elem.get('idref', 'unknown') if profile_elem is not None else 'unknown'
+            benchmark_id = None
+            benchmark_version = None
+            test_result_done = False
+            profile = None
+            target_hostname = None
+            start_time_text = None
             
-            # Get target info
-            target_elem = test_result.find('xccdf:target', self.namespaces)
-            target_hostname = target_elem.text if target_elem is not None else hostname or 'unknown'
+            # Rule id -> (severity, title, severity counter index), built as the
+            # definitions stream past
+            rule_index = {}
             
-            # Get scan time
-            start_time_elem = test_result.find('xccdf:start-time', self.namespaces)
-            scan_time = time.time()  # Default to now
-            if start_time_elem is not None:
-                try:
-                    scan_time = datetime.fromisoformat(start_time_elem.text.replace('Z', '+00:00')).timestamp()
-                except:
-                    pass
-            
-            # Initialize counters
-            metrics = {
-                'total_rules': 0,
-                'passed_rules': 0,
-                'failed_rules': 0,
-                'error_rules': 0,
-                'unknown_rules': 0,
-                'notapplicable_rules': 0,
-                'notchecked_rules': 0,
-                'informational_rules': 0,
-                'severity_high_failed': 0,
-                'severity_medium_failed': 0,
-                'severity_low_failed': 0,
-                'severity_info_failed': 0
-            }
+            # Initialize counters as locals; they are bumped once per rule
+            total = 0
+            status_counts = [0] * (_RESULT_UNCOUNTED + 1)
+            result_to_counter = _RESULT_TO_COUNTER.get
+            severity_failed = [0] * (_SEV_UNKNOWN_BUCKET + 1)
+            sev_to_bucket = _SEV_TO_BUCKET.get
             
+            collect_rule_details = self.collect_rule_details
             rule_details = []
             
-            # Process rule results
-            for rule_result in test_result.findall('xccdf:rule-result', self.namespaces):
-                rule_id = rule_result.get('idref', '')
-                metrics['total_rules'] += 1
+            # Stream the document instead of building the whole tree. XCCDF
+            # places the Rule definitions before the TestResult, so every
+            # rule-result can be resolved against the index as it arrives.
+            for _, elem in ET.iterparse(source, events=('end',),
+                                        **self._iterparse_options):
+                tag = elem.tag
                 
-                # Get result status
-                result_elem = rule_result.find('xccdf:result', self.namespaces)
-                if result_elem is None:
-                    continue
+                if tag == rule_result_tag:
+                    # Only the first TestResult in the document is reported
+                    if not test_result_done:
+                        rule_id = elem.get('idref', '')
+                        total += 1
+                        
+                        # Get result status; it is one of the first children,
+                        # so a direct walk beats a path lookup
+                        result_elem = None
+                        for child in elem:
+                            if child.tag == result_tag:
+                                result_elem = child
+                                break
+                        
+                        if result_elem is not None:
+                            result_status = result_elem.text.lower()
+                            
+                            severity, rule_title, severity_bucket = (
+                                rule_index.get(rule_id) or ('unknown', rule_id, _SEV_UNKNOWN_BUCKET))
+                            
+                            # Count by status; failed rules are also
+                            # counted by severity
+                            counter = result_to_counter(result_status, _RESULT_UNCOUNTED)
+                            status_counts[counter] += 1
+                            if counter == _RESULT_FAIL:
+                                severity_failed[severity_bucket] += 1
+                            
+                            # Store rule details
+                            if collect_rule_details:
+                                rule_details.append({
+                                    'rule_id': rule_id,
+                                    'title': rule_title,
+                                    'result': sys.intern(result_status),
+                                    'severity': severity
+                                })
+                    
+                    self._release(elem)
+                
+                elif tag == rule_tag:
+                    rule_id = elem.get('id')
+                    # Titles only appear in the per-rule details
+                    rule_title = None
+                    if collect_rule_details:
+                        for child in elem:
+                            if child.tag == title_tag:
+                                rule_title = child.text
+                                break
+                    
+                    severity = sys.intern(elem.get('severity', 'unknown').lower())
+                    rule_index[rule_id] = (
+                        severity,
+                        rule_title or rule_id,
+                        sev_to_bucket(severity, _SEV_UNKNOWN_BUCKET)
+                    )
+                    
+                    self._release(elem)
+                
+                elif tag == benchmark_tag:
+                    if benchmark_id is None:
+                        benchmark_id = elem.get('id', 'unknown')
+                        benchmark_version = elem.get('version', 'unknown')
+                    elem.clear()
                 
-                result_status = result_elem.text.lower()
+                elif tag == test_result_tag:
+                    test_result_done = True
+                    elem.clear()
                 
-                # Count by status - map result status to metric key
-                status_mapping = {
-                    'pass': 'passed_rules',
-                    'fail': 'failed_rules', 
-                    'error': 'error_rules',
-                    'unknown': 'unknown_rules',
-                    'notapplicable': 'notapplicable_rules',
-                    'notchecked': 'notchecked_rules',
-                    'informational': 'informational_rules'
-                }
+                elif tag == result_tag or tag == title_tag:
+                    # Still needed when the enclosing rule-result or Rule ends
+                    continue
                 
-                if result_status in status_mapping:
-                    metrics[status_mapping[result_status]] += 1
+                elif test_result_done:
+                    elem.clear()
                 
-                # Get rule definition for severity
-                rule_def = benchmark.find(f'.//xccdf:Rule[@id="{rule_id}"]', self.namespaces)
-                severity = 'unknown'
-                rule_title = rule_id
+                elif tag == profile_tag:
+                    if profile is None:
+                        profile = elem.get('idref', 'unknown')
                 
-                if rule_def is not None:
-                    severity = rule_def.get('severity', 'unknown').lower()
-                    title_elem = rule_def.find('xccdf:title', self.namespaces)
-                    if title_elem is not None:
-                        rule_title = title_elem.text or rule_id
+                elif tag == target_tag:
+                    if target_hostname is None:
+                        target_hostname = elem.text
                 
-                # Count failed rules by severity
-                if result_status == 'fail':
-                    severity_key = f'severity_{severity}_failed'
-                    if severity_key in metrics:
-                        metrics[severity_key] += 1
+                elif tag == start_time_tag:
+                    if start_time_text is None:
+                        start_time_text = elem.text
                 
-                # Store rule details
-                rule_details.append({
-                    'rule_id': rule_id,
-                    'title': rule_title,
-                    'result': result_status,
-                    'severity': severity
-                })
+                else:
+                    # Profiles, Groups, Values, checks and the like are never
+                    # read; free each subtree as soon as it is complete
+                    elem.clear()
+            
+            if benchmark_id is None:
+                logger.error("No benchmark found in SCAP results")
+                return None
+            
+            if not test_result_done:
+                logger.error("No test results found in SCAP results")
+                return None
+            
+            if profile is None:
+                profile = 'unknown'
+            
+            if target_hostname is None:
+                target_hostname = hostname or 'unknown'
+            
+            # These become metric label values on every update; interned
+            # copies make the label lookups hit on identity
+            target_hostname = sys.intern(target_hostname)
+            profile = sys.intern(profile)
+            benchmark_id = sys.intern(benchmark_id)
+            
+            # Get scan time
+            scan_time = time.time()  # Default to now
+            if start_time_text:
+                try:
+                    scan_time = self._parse_timestamp(start_time_text)
+                except ValueError:
+                    logger.warning(f"Invalid scan start time: {start_time_text}")
+            
+            (passed, failed, error, unknown, notapplicable, notchecked,
+             informational) = status_counts[:_RESULT_UNCOUNTED]
             
             # Calculate compliance score
             compliance_score = 0.0
-            if metrics['total_rules'] > 0:
+            if total > 0:
                 # Compliance = passed / (total - notapplicable - notchecked)
-                applicable_rules = metrics['total_rules'] - metrics['notapplicable_rules'] - metrics['notchecked_rules']
+                applicable_rules = total - notapplicable - notchecked
                 if applicable_rules > 0:
-                    compliance_score = (metrics['passed_rules'] / applicable_rules) * 100
+                    compliance_score = (passed / applicable_rules) * 100
+            
+            high_failed, medium_failed, low_failed, info_failed = severity_failed[:_SEV_UNKNOWN_BUCKET]
             
             return SCAPResult(
                 hostname=target_hostname,
@@ -185,12 +341,41 @@ class SCAPParser:
                 benchmark_id=benchmark_id,
                 benchmark_version=benchmark_version,
                 rule_details=rule_details,
-                **metrics
+                total_rules=total,
+                passed_rules=passed,
+                failed_rules=failed,
+                error_rules=error,
+                unknown_rules=unknown,
+                notapplicable_rules=notapplicable,
+                notchecked_rules=notchecked,
+                informational_rules=informational,
+                severity_high_failed=high_failed,
+                severity_medium_failed=medium_failed,
+                severity_low_failed=low_failed,
+                severity_info_failed=info_failed
             )
             
         except Exception as e:
             logger.error(f"Error parsing SCAP results: {e}")
             return None
+    
+    @staticmethod
+    def _parse_timestamp(text: str) -> float:
+        """Convert an ISO 8601 timestamp to seconds since the epoch"""
+        # fromisoformat() only accepts a 'Z' suffix from Python 3.11 on
+        if text.endswith('Z'):
+            text = text[:-1] + '+00:00'
+        return datetime.fromisoformat(text).timestamp()
+    
+    @staticmethod
+    def _release(elem):
+        """Free a fully processed element while streaming"""
+        elem.clear()
+        if LXML_AVAILABLE:
+            # lxml keeps cleared elements attached to their parent; drop the
+            # finished siblings as well so memory stays flat
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
 
 class SCAPScanner:
     """SCAP scanner wrapper"""
@@ -256,11 +441,32 @@ class SCAPScanner:
 class PrometheusExporter:
     """Prometheus metrics exporter for SCAP results"""
     
-    def __init__(self, registry: CollectorRegistry = None):
-        self.registry = registry or REGISTRY
+    def __init__(self, registry: CollectorRegistry = None, cache_ttl: float = 5.0):
+        # A private registry unless the caller supplies one, so building an
+        # exporter never registers collectors process-wide by accident
+        self.registry = registry or CollectorRegistry()
         self._setup_metrics()
         self.latest_results: Dict[str, SCAPResult] = {}
         
+        # Labelled metric children, keyed by (metric, label values)
+        self._children: Dict[Tuple, object] = {}
+        
+        # Serialized /metrics output, shared by scrapes until it goes stale
+        self.cache_ttl = cache_ttl
+        self._cache_lock = threading.Lock()
+        self._version = 0
+        self._cached_version = -1
+        self._cached_at = 0.0
+        self._cached_metrics: Optional[bytes] = b''
+        self._cached_gzip: Optional[bytes] = None
+        self._result_dicts: Dict[str, Dict] = {}
+        self._results_version = -1
+        self._cached_results = b''
+        # Bumped on every rendering; large renderings move out of the byte
+        # caches into these in-memory files, keyed by compression
+        self._rendering = 0
+        self._spill_files: Dict[bool, Tuple[int, object, int]] = {}
+        
     def _setup_metrics(self):
         """Setup Prometheus metrics"""
         self.compliance_score = Gauge(
@@ -307,12 +513,13 @@ class PrometheusExporter:
     
     def update_metrics(self, result: SCAPResult):
         """Update Prometheus metrics with SCAP results"""
-        labels = [result.hostname, result.profile, result.benchmark_id]
+        labels = (result.hostname, result.profile, result.benchmark_id)
+        child = self._child
         
         # Update main metrics
-        self.compliance_score.labels(*labels).set(result.compliance_score)
-        self.total_rules.labels(*labels).set(result.total_rules)
-        self.last_scan_timestamp.labels(*labels).set(result.scan_time)
+        child(self.compliance_score, *labels).set(result.compliance_score)
+        child(self.total_rules, *labels).set(result.total_rules)
+        child(self.last_scan_timestamp, *labels).set(result.scan_time)
         
         # Update rules by status
         status_metrics = {
@@ -326,36 +533,215 @@ class PrometheusExporter:
         }
         
         for status, count in status_metrics.items():
-            self.rules_by_status.labels(*labels, status).set(count)
+            child(self.rules_by_status, *labels, status).set(count)
         
         # Update failed rules by severity
-        severity_metrics = {
-            'high': result.severity_high_failed,
-            'medium': result.severity_medium_failed,
-            'low': result.severity_low_failed,
-            'info': result.severity_info_failed
-        }
-        
-        for severity, count in severity_metrics.items():
-            self.failed_by_severity.labels(*labels, severity).set(count)
+        for severity, count in result.failed_by_severity.items():
+            child(self.failed_by_severity, *labels, severity).set(count)
         
         # Update scan info
-        self.scan_info.labels(result.hostname, result.profile).info({
+        child(self.scan_info, result.hostname, result.profile).info({
             'benchmark_id': result.benchmark_id,
             'benchmark_version': result.benchmark_version,
             'scan_time': datetime.fromtimestamp(result.scan_time).isoformat()
         })
         
-        # Store result
+        # Store result, converted once for the /results endpoint
         key = f"{result.hostname}_{result.profile}"
-        self.latest_results[key] = result
+        result_dict = asdict(result)
+        with self._cache_lock:
+            self.latest_results[key] = result
+            self._result_dicts[key] = result_dict
+            self._version += 1
         
         logger.info(f"Updated metrics for {result.hostname} ({result.profile}): "
                    f"{result.compliance_score:.1f}% compliance")
+    
+    def refresh_scan_timestamp(self, result: SCAPResult, scan_time: float):
+        """Record a new scan of unchanged results without re-exporting them"""
+        labels = (result.hostname, result.profile, result.benchmark_id)
+        self._child(self.last_scan_timestamp, *labels).set(scan_time)
+        with self._cache_lock:
+            self._version += 1
+    
+    def _child(self, metric, *labelvalues):
+        """Return the labelled child of a metric, looked up once per label set"""
+        key = (metric, labelvalues)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = metric.labels(*labelvalues)
+        return child
+    
+    def generate_metrics(self, compressed: bool = False) -> bytes:
+        """Return the serialized (optionally gzipped) metrics, reusing the last output while it is fresh"""
+        with self._cache_lock:
+            self._refresh_locked()
+            return self._body_locked(compressed)
+    
+    def metrics_payload(self, compressed: bool = False) -> Tuple[int, Optional[bytes], Optional[object]]:
+        """Return the size of the cached metrics and either their bytes or, for
+        large outputs, a file holding them
+        
+        The caller owns the returned file and must close it after sending.
+        """
+        with self._cache_lock:
+            self._refresh_locked()
+            spilled = self._spill_files.get(compressed)
+            if spilled is None or spilled[0] != self._rendering:
+                body = self._body_locked(compressed)
+                if len(body) < SENDFILE_THRESHOLD or not hasattr(os, 'memfd_create'):
+                    return len(body), body, None
+                
+                # Move the rendering into an anonymous in-memory file once so
+                # scrapes can splice it to the socket without userspace
+                # copies, and drop the bytes so it is not held twice
+                if spilled is not None:
+                    spilled[1].close()
+                spill_file = open(os.memfd_create('scap-metrics', os.MFD_CLOEXEC), 'w+b')
+                spill_file.write(body)
+                spill_file.flush()
+                spilled = self._spill_files[compressed] = (self._rendering, spill_file, len(body))
+                if compressed:
+                    self._cached_gzip = None
+                else:
+                    self._cached_metrics = None
+            
+            return spilled[2], None, self._open_spilled(spilled[1])
+    
+    @staticmethod
+    def _open_spilled(spill_file):
+        """Open a separate read handle on a spill file for one sender
+        
+        Each sender gets its own descriptor, so rotating the spill file never
+        closes one that is still being sent. Reopening through /proc also gives
+        it its own file offset. Without /proc the handle is a dup(), which
+        shares the offset with every other copy: senders must then pass an
+        explicit offset (sendfile(file, 0, size)) and never read() or seek(),
+        or concurrent scrapes corrupt each other.
+        """
+        fd = spill_file.fileno()
+        try:
+            return open(f'/proc/self/fd/{fd}', 'rb')
+        except OSError:
+            return open(os.dup(fd), 'rb')
+    
+    def _refresh_locked(self):
+        """Re-render the metrics if they changed or went stale; caller holds the cache lock"""
+        now = time.monotonic()
+        if (self._cached_version != self._version
+                or now - self._cached_at >= self.cache_ttl):
+            # Record the version first so an update racing with the
+            # rebuild still invalidates the result
+            self._cached_version = self._version
+            self._cached_metrics = generate_latest(self.registry)
+            self._cached_gzip = None
+            self._cached_at = now
+            self._rendering += 1
+    
+    def _body_locked(self, compressed: bool) -> bytes:
+        """Return the current rendering as bytes; caller holds the cache lock"""
+        if not compressed:
+            if self._cached_metrics is None:
+                return self._read_spilled(False)
+            return self._cached_metrics
+        
+        if self._cached_gzip is None:
+            spilled = self._spill_files.get(True)
+            if spilled is not None and spilled[0] == self._rendering:
+                return self._read_spilled(True)
+            # Compress once per rendering; level 1 gets most of the gain on
+            # the repetitive exposition format for a fraction of the CPU
+            self._cached_gzip = gzip.compress(self._body_locked(False), compresslevel=1)
+        return self._cached_gzip
+    
+    def _read_spilled(self, compressed: bool) -> bytes:
+        """Copy a spilled rendering back out of its in-memory file"""
+        _, spill_file, size = self._spill_files[compressed]
+        # pread leaves the offset shared with in-flight senders untouched
+        return os.pread(spill_file.fileno(), size, 0)
+    
+    def generate_results(self) -> bytes:
+        """Return the latest results as indented JSON, serialized once per update"""
+        with self._cache_lock:
+            if self._results_version != self._version:
+                self._results_version = self._version
+                if orjson is not None:
+                    self._cached_results = orjson.dumps(self._result_dicts,
+                                                        option=orjson.OPT_INDENT_2)
+                else:
+                    # Raw UTF-8 like orjson rather than \uXXXX escapes; very
+                    # large or small floats can still be spelled differently
+                    # (1e+16 vs 1e16), so the bytes are not guaranteed equal
+                    self._cached_results = json.dumps(self._result_dicts, indent=2,
+                                                      ensure_ascii=False).encode()
+            return self._cached_results
+
+class MetricsHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server for the metrics endpoint"""
+    
+    def __init__(self, server_address, handler_class, reuse_port: bool = False):
+        # SO_REUSEPORT lets several exporter processes share one port, with
+        # the kernel balancing incoming connections between them
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class)
+    
+    def server_bind(self):
+        if self.reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header lists gzip with a non-zero q-value"""
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() not in ('gzip', 'x-gzip'):
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        return quality > 0
+    return False
+
+def write_metrics(handler: BaseHTTPRequestHandler, exporter: PrometheusExporter):
+    """Send the exporter's metrics as a complete 200 response
+    
+    The body is gzipped when the client accepts it, and large outputs are
+    spliced to the socket from the exporter's in-memory copy with sendfile().
+    """
+    accepts_gzip = _accepts_gzip(handler.headers.get('Accept-Encoding', ''))
+    size, metrics_output, metrics_file = exporter.metrics_payload(compressed=accepts_gzip)
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/plain; charset=utf-8')
+    handler.send_header('Content-Length', str(size))
+    # The body depends on Accept-Encoding; caches in front must key on it
+    handler.send_header('Vary', 'Accept-Encoding')
+    if accepts_gzip:
+        handler.send_header('Content-Encoding', 'gzip')
+    handler.end_headers()
+    if metrics_file is not None:
+        with metrics_file:
+            handler.wfile.flush()
+            # Always give the offset: the handle may share its file offset
+            # with concurrent senders (see PrometheusExporter._open_spilled)
+            handler.connection.sendfile(metrics_file, 0, size)
+    else:
+        handler.wfile.write(metrics_output)
 
 class MetricsHTTPHandler(BaseHTTPRequestHandler):
     """HTTP handler for Prometheus metrics endpoint"""
     
+    # Keep scraper connections open between requests (every response sets
+    # Content-Length), and send headers and body without Nagle delays
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    # Drop idle keep-alive connections so they do not pin handler threads
+    timeout = 120
+    
     def __init__(self, exporter: PrometheusExporter, *args, **kwargs):
         self.exporter = exporter
         super().__init__(*args, **kwargs)
@@ -363,27 +749,23 @@ class MetricsHTTPHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         if self.path == '/metrics':
             try:
-                metrics_output = generate_latest(self.exporter.registry)
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/plain; charset=utf-8')
-                self.end_headers()
-                self.wfile.write(metrics_output)
+                write_metrics(self, self.exporter)
             except Exception as e:
                 logger.error(f"Error generating metrics: {e}")
                 self.send_error(500)
         elif self.path == '/health':
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(HEALTH_RESPONSE)))
             self.end_headers()
-            self.wfile.write(b'{"status": "healthy"}')
+            self.wfile.write(HEALTH_RESPONSE)
         elif self.path == '/results':
+            results_json = self.exporter.generate_results()
             self.send_response(200)
             self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(results_json)))
             self.end_headers()
-            results_json = {
-                key: asdict(result) for key, result in self.exporter.latest_results.items()
-            }
-            self.wfile.write(json.dumps(results_json, indent=2).encode())
+            self.wfile.write(results_json)
         else:
             self.send_error(404)
     
@@ -394,12 +776,22 @@ class MetricsHTTPHandler(BaseHTTPRequestHandler):
 class SCAPExporterDaemon:
     """Main SCAP exporter daemon"""
     
-    def __init__(self, config_file: str):
+    def __init__(self, config_file: str, registry: CollectorRegistry = None):
         self.config = self._load_config(config_file)
-        self.parser = SCAPParser()
+        self.parser = SCAPParser(
+            collect_rule_details=self.config.get('collect_rule_details', True)
+        )
         self.scanner = SCAPScanner(self.config.get('scanner', {}))
-        self.exporter = PrometheusExporter()
-        self.running = False
+        # By default export on the global registry, which also carries the
+        # process and GC collectors
+        self.exporter = PrometheusExporter(registry or REGISTRY,
+                                           cache_ttl=self.config.get('metrics_cache_ttl', 5.0))
+        
+        # Set to stop the scan loop; waiting on it keeps shutdown immediate
+        self._stop = threading.Event()
+        
+        # (profile, content file) -> (results digest, parsed result) of the last scan
+        self._last_scans: Dict[Tuple[str, Optional[str]], Tuple[bytes, SCAPResult]] = {}
         
     def _load_config(self, config_file: str) -> Dict:
         """Load configuration from YAML file"""
@@ -421,12 +813,22 @@ class SCAPExporterDaemon:
                 logger.error("SCAP scan failed")
                 return
             
-            # Parse results
-            hostname = self.config.get('hostname', os.uname().nodename)
-            result = self.parser.parse_results(results_file, hostname)
-            
-            # Cleanup temporary file
-            os.unlink(results_file)
+            scan_key = (profile, content_file)
+            try:
+                # Skip parsing when the scan produced exactly the same results
+                digest = self._file_digest(results_file)
+                previous = self._last_scans.get(scan_key)
+                if previous is not None and previous[0] == digest:
+                    logger.info(f"SCAP results unchanged for profile {profile}, skipping parse")
+                    self.exporter.refresh_scan_timestamp(previous[1], time.time())
+                    return
+                
+                # Parse results
+                hostname = self.config.get('hostname', os.uname().nodename)
+                result = self.parser.parse_results(results_file, hostname)
+            finally:
+                # Cleanup temporary file, whatever happened to it
+                os.unlink(results_file)
             
             if not result:
                 logger.error("Failed to parse SCAP results")
@@ -434,29 +836,46 @@ class SCAPExporterDaemon:
             
             # Update metrics
             self.exporter.update_metrics(result)
+            self._last_scans[scan_key] = (digest, result)
             
         except Exception as e:
             logger.error(f"Error in scan_and_update: {e}")
     
+    @staticmethod
+    def _file_digest(path: str) -> bytes:
+        """Hash a results file in 1 MiB chunks"""
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        return hasher.digest()
+    
     def start_http_server(self, port: int = 9154):
         """Start HTTP server for metrics"""
         def handler_factory(*args, **kwargs):
             return MetricsHTTPHandler(self.exporter, *args, **kwargs)
         
-        server = HTTPServer(('', port), handler_factory)
+        # One thread per request so a slow scrape never blocks /health
+        server = MetricsHTTPServer(('', port), handler_factory,
+                                   reuse_port=self.config.get('http_reuse_port', False))
         logger.info(f"Starting HTTP server on port {port}")
         
-        def serve():
-            while self.running:
-                server.handle_request()
-        
-        thread = threading.Thread(target=serve, daemon=True)
+        thread = threading.Thread(target=server.serve_forever,
+                                  kwargs={'poll_interval': 0.5}, daemon=True)
         thread.start()
         return server
     
+    def stop(self):
+        """Ask the main run loop to exit"""
+        self._stop.set()
+    
     def run(self):
         """Main run loop"""
-        self.running = True
+        self._stop.clear()
+        
+        # Treat SIGTERM (e.g. docker stop) like Ctrl+C
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
         
         # Start HTTP server
         port = self.config.get('http_port', 9154)
@@ -469,7 +888,7 @@ class SCAPExporterDaemon:
             return
         
         try:
-            while self.running:
+            while not self._stop.is_set():
                 for scan_config in scans:
                     profile = scan_config.get('profile')
                     content_file = scan_config.get('content_file')
@@ -481,16 +900,18 @@ class SCAPExporterDaemon:
                     
                     self.scan_and_update(profile, content_file)
                     
-                    if not self.running:
+                    if self._stop.is_set():
                         break
                     
                     logger.info(f"Sleeping for {interval} seconds until next scan")
-                    time.sleep(interval)
+                    if self._stop.wait(interval):
+                        break
                     
         except KeyboardInterrupt:
             logger.info("Received interrupt signal")
         finally:
-            self.running = False
+            self._stop.set()
+            server.shutdown()
             server.server_close()
 
 def main():
@@ -508,7 +929,7 @@ def main():
     if args.results_file:
         # Parse existing results file
         parser_obj = SCAPParser()
-        exporter = PrometheusExporter()
+        exporter = PrometheusExporter(REGISTRY)
         
         result = parser_obj.parse_results(args.results_file)
         if result:
@@ -3,101 +3,249 @@
 Test script for SCAP Prometheus Exporter
 """
 
-import xml.etree.ElementTree as ET
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 import tempfile
 import os
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-def create_sample_scap_results():
-    """Create a sample SCAP results XML for testing"""
+XCCDF_NS = 'http://checklists.nist.gov/xccdf/1.2'
+
+# (rule id suffix, severity, title, result) for each rule in the sample
+SAMPLE_RULES = [
+    ('accounts_password_minlen_login_defs', 'medium', 'Set Password Minimum Length', 'pass'),
+    ('accounts_max_concurrent_login_sessions', 'high', 'Limit Concurrent Login Sessions', 'fail'),
+    ('service_ssh_disabled', 'low', 'Disable SSH Service', 'fail'),
+    ('bootloader_password', 'medium', 'Set Boot Loader Password', 'notapplicable'),
+    ('package_sudo_installed', 'info', 'Install sudo Package', 'error'),
+]
+
+def _xccdf(tag):
+    """Clark-notation name of an XCCDF 1.2 element"""
+    return '{%s}%s' % (XCCDF_NS, tag)
+
+def build_sample_scap_results():
+    """Build a sample SCAP results document and serialize it to bytes"""
+    ET.register_namespace('xccdf', XCCDF_NS)
+    root = ET.Element(_xccdf('TestResult'), id='xccdf_org.open-scap_testresult_standard')
     
-    sample_xml = '''<?xml version="1.0" encoding="UTF-8"?>
-<xccdf:TestResult xmlns:xccdf="http://checklists.nist.gov/xccdf/1.2"
-                  id="xccdf_org.open-scap_testresult_standard">
-    <xccdf:benchmark href="/usr/share/xml/scap/ssg/content/ssg-test-ds.xml">
-        <xccdf:Benchmark xmlns:xccdf="http://checklists.nist.gov/xccdf/1.2" 
-                         id="xccdf_org.ssgproject.content_benchmark_DEBIAN"
-                         version="1.0">
-            <!-- Rule definitions with severity -->
-            <xccdf:Rule id="xccdf_org.ssgproject.content_rule_accounts_password_minlen_login_defs" severity="medium">
-                <xccdf:title>Set Password Minimum Length</xccdf:title>
-            </xccdf:Rule>
-            
-            <xccdf:Rule id="xccdf_org.ssgproject.content_rule_accounts_max_concurrent_login_sessions" severity="high">
-                <xccdf:title>Limit Concurrent Login Sessions</xccdf:title>
-            </xccdf:Rule>
-            
-            <xccdf:Rule id="xccdf_org.ssgproject.content_rule_service_ssh_disabled" severity="low">
-                <xccdf:title>Disable SSH Service</xccdf:title>
-            </xccdf:Rule>
-            
-            <xccdf:Rule id="xccdf_org.ssgproject.content_rule_bootloader_password" severity="medium">
-                <xccdf:title>Set Boot Loader Password</xccdf:title>
-            </xccdf:Rule>
-            
-            <xccdf:Rule id="xccdf_org.ssgproject.content_rule_package_sudo_installed" severity="info">
-                <xccdf:title>Install sudo Package</xccdf:title>
-            </xccdf:Rule>
-        </xccdf:Benchmark>
-    </xccdf:benchmark>
+    # Rule definitions with severity
+    benchmark_ref = ET.SubElement(root, _xccdf('benchmark'),
+                                  href='/usr/share/xml/scap/ssg/content/ssg-test-ds.xml')
+    benchmark = ET.SubElement(benchmark_ref, _xccdf('Benchmark'),
+                              id='xccdf_org.ssgproject.content_benchmark_DEBIAN',
+                              version='1.0')
+    for rule_name, severity, title, _ in SAMPLE_RULES:
+        rule = ET.SubElement(benchmark, _xccdf('Rule'),
+                             id=f'xccdf_org.ssgproject.content_rule_{rule_name}',
+                             severity=severity)
+        ET.SubElement(rule, _xccdf('title')).text = title
     
-    <xccdf:profile idref="xccdf_org.ssgproject.content_profile_cis"/>
-    <xccdf:target>test-server</xccdf:target>
-    <xccdf:start-time>2024-01-01T12:00:00Z</xccdf:start-time>
+    ET.SubElement(root, _xccdf('profile'), idref='xccdf_org.ssgproject.content_profile_cis')
+    ET.SubElement(root, _xccdf('target')).text = 'test-server'
+    ET.SubElement(root, _xccdf('start-time')).text = '2024-01-01T12:00:00Z'
     
-    <!-- Passed rule -->
-    <xccdf:rule-result idref="xccdf_org.ssgproject.content_rule_accounts_password_minlen_login_defs">
-        <xccdf:result>pass</xccdf:result>
-    </xccdf:rule-result>
+    # One passed, two failed, one not applicable and one error result
+    for rule_name, _, _, result in SAMPLE_RULES:
+        rule_result = ET.SubElement(root, _xccdf('rule-result'),
+                                    idref=f'xccdf_org.ssgproject.content_rule_{rule_name}')
+        ET.SubElement(rule_result, _xccdf('result')).text = result
     
-    <!-- Failed rules with different severities -->
-    <xccdf:rule-result idref="xccdf_org.ssgproject.content_rule_accounts_max_concurrent_login_sessions">
-        <xccdf:result>fail</xccdf:result>
-    </xccdf:rule-result>
+    return ET.tostring(root, encoding='UTF-8', xml_declaration=True)
+
+def build_oscap_layout_results():
+    """Build the same results in the layout `oscap xccdf eval --results` writes
     
-    <xccdf:rule-result idref="xccdf_org.ssgproject.content_rule_service_ssh_disabled">
-        <xccdf:result>fail</xccdf:result>
-    </xccdf:rule-result>
+    The Benchmark is the root, Rules sit in nested Groups after the Profile
+    and Value definitions, and the TestResult comes last.
+    """
+    ET.register_namespace('xccdf', XCCDF_NS)
+    root = ET.Element(_xccdf('Benchmark'),
+                      id='xccdf_org.ssgproject.content_benchmark_DEBIAN',
+                      version='1.0')
+    ET.SubElement(root, _xccdf('title')).text = 'Guide to the Secure Configuration of Debian'
     
-    <!-- Not applicable rule -->
-    <xccdf:rule-result idref="xccdf_org.ssgproject.content_rule_bootloader_password">
-        <xccdf:result>notapplicable</xccdf:result>
-    </xccdf:rule-result>
+    profile = ET.SubElement(root, _xccdf('Profile'), id='xccdf_org.ssgproject.content_profile_cis')
+    ET.SubElement(profile, _xccdf('title')).text = 'CIS Benchmark'
+    for rule_name, _, _, _ in SAMPLE_RULES:
+        ET.SubElement(profile, _xccdf('select'),
+                      idref=f'xccdf_org.ssgproject.content_rule_{rule_name}', selected='true')
     
-    <!-- Error rule -->
-    <xccdf:rule-result idref="xccdf_org.ssgproject.content_rule_package_sudo_installed">
-        <xccdf:result>error</xccdf:result>
-    </xccdf:rule-result>
-</xccdf:TestResult>'''
+    value = ET.SubElement(root, _xccdf('Value'), id='xccdf_org.ssgproject.content_value_var_password_minlen')
+    ET.SubElement(value, _xccdf('value')).text = '14'
     
-    # Create temporary file
-    fd, temp_file = tempfile.mkstemp(suffix='.xml', prefix='test_scap_results_')
-    try:
-        with os.fdopen(fd, 'w') as f:
-            f.write(sample_xml)
-        return temp_file
-    except:
-        os.close(fd)
-        raise
+    system = ET.SubElement(root, _xccdf('Group'), id='xccdf_org.ssgproject.content_group_system')
+    ET.SubElement(system, _xccdf('title')).text = 'System Settings'
+    ET.SubElement(system, _xccdf('description')).text = 'Settings that apply to the whole system'
+    for index, (rule_name, severity, title, _) in enumerate(SAMPLE_RULES):
+        group = ET.SubElement(system, _xccdf('Group'),
+                              id=f'xccdf_org.ssgproject.content_group_{index}')
+        ET.SubElement(group, _xccdf('title')).text = f'Group {index}'
+        rule = ET.SubElement(group, _xccdf('Rule'),
+                             id=f'xccdf_org.ssgproject.content_rule_{rule_name}',
+                             severity=severity, selected='false')
+        ET.SubElement(rule, _xccdf('title')).text = title
+        ET.SubElement(rule, _xccdf('description')).text = f'Description of {title}'
+        check = ET.SubElement(rule, _xccdf('check'), system='http://oval.mitre.org/XMLSchema/oval-definitions-5')
+        ET.SubElement(check, _xccdf('check-content-ref'), href='ssg-debian-oval.xml', name=f'oval:{index}')
+    
+    test_result = ET.SubElement(root, _xccdf('TestResult'), id='xccdf_org.open-scap_testresult_standard')
+    ET.SubElement(test_result, _xccdf('title')).text = 'OSCAP Scan Result'
+    ET.SubElement(test_result, _xccdf('profile'), idref='xccdf_org.ssgproject.content_profile_cis')
+    ET.SubElement(test_result, _xccdf('target')).text = 'test-server'
+    ET.SubElement(test_result, _xccdf('start-time')).text = '2024-01-01T12:00:00Z'
+    for index, (rule_name, _, _, result) in enumerate(SAMPLE_RULES):
+        rule_result = ET.SubElement(test_result, _xccdf('rule-result'),
+                                    idref=f'xccdf_org.ssgproject.content_rule_{rule_name}')
+        ET.SubElement(rule_result, _xccdf('result')).text = result
+        check = ET.SubElement(rule_result, _xccdf('check'), system='http://oval.mitre.org/XMLSchema/oval-definitions-5')
+        ET.SubElement(check, _xccdf('check-content-ref'), href='ssg-debian-oval.xml', name=f'oval:{index}')
+    
+    return ET.tostring(root, encoding='UTF-8', xml_declaration=True)
+
+# Built once and shared by every test
+SAMPLE_XML_BYTES = build_sample_scap_results()
+OSCAP_LAYOUT_XML_BYTES = build_oscap_layout_results()
+
+# What both sample documents must parse to
+EXPECTED_SAMPLE_RESULT = {
+    'hostname': 'test-server',
+    'profile': 'xccdf_org.ssgproject.content_profile_cis',
+    'benchmark_id': 'xccdf_org.ssgproject.content_benchmark_DEBIAN',
+    'benchmark_version': '1.0',
+    'total_rules': 5,
+    'passed_rules': 1,
+    'failed_rules': 2,
+    'error_rules': 1,
+    'unknown_rules': 0,
+    'notapplicable_rules': 1,
+    'notchecked_rules': 0,
+    'informational_rules': 0,
+    'severity_high_failed': 1,
+    'severity_medium_failed': 0,
+    'severity_low_failed': 1,
+    'severity_info_failed': 0,
+    'compliance_score': 25.0,
+    'scan_time': 1704110400.0,
+}
+
+def _check_sample_results():
+    """Parse both sample layouts and return a description of every mismatch"""
+    from scap_prometheus_exporter import SCAPParser
+    
+    problems = []
+    parser = SCAPParser()
+    for layout, data in (('TestResult-rooted', SAMPLE_XML_BYTES),
+                         ('Benchmark-rooted', OSCAP_LAYOUT_XML_BYTES)):
+        result = parser.parse_results_bytes(data, "fallback-host")
+        if result is None:
+            problems.append(f"{layout}: no result returned")
+            continue
+        for field, expected in EXPECTED_SAMPLE_RESULT.items():
+            actual = getattr(result, field)
+            if actual != expected:
+                problems.append(f"{layout}: {field} is {actual!r}, expected {expected!r}")
+    return problems
+
+# Re-runs the sample checks in a fresh interpreter that cannot import lxml
+_STDLIB_CHECK = """
+import sys
+sys.modules['lxml'] = sys.modules['lxml.etree'] = None
+import test_exporter
+problems = test_exporter._check_sample_results()
+print('\\n'.join(problems))
+sys.exit(1 if problems else 0)
+"""
+
+_parsed_result = None
+
+def _get_sample_result():
+    """Parse the sample SCAP results once and return the shared result"""
+    global _parsed_result
+    if _parsed_result is None:
+        from scap_prometheus_exporter import SCAPParser
+        _parsed_result = SCAPParser().parse_results_bytes(SAMPLE_XML_BYTES, "test-server")
+    return _parsed_result
+
+def _new_exporter():
+    """Build an exporter on its own registry so tests never share collectors"""
+    from prometheus_client import CollectorRegistry
+    from scap_prometheus_exporter import PrometheusExporter
+    return PrometheusExporter(CollectorRegistry())
+
+# Unnamed temporary files need Linux O_TMPFILE and /proc to reopen them by fd
+_USE_O_TMPFILE = hasattr(os, 'O_TMPFILE') and os.path.isdir('/proc/self/fd')
+
+def _write_sample(data):
+    """Write bytes to a temporary file and return its (fd, path)"""
+    global _USE_O_TMPFILE
+    if _USE_O_TMPFILE:
+        try:
+            fd = os.open(tempfile.gettempdir(), os.O_TMPFILE | os.O_RDWR, 0o600)
+        except OSError:
+            # Filesystem without O_TMPFILE support
+            _USE_O_TMPFILE = False
+        else:
+            os.write(fd, data)
+            return fd, f'/proc/self/fd/{fd}'
+    
+    fd, path = tempfile.mkstemp(suffix='.xml', prefix='test_scap_results_')
+    os.write(fd, data)
+    return fd, path
+
+def _remove_sample(fd, path):
+    """Close and delete a file created by _write_sample"""
+    os.close(fd)
+    # O_TMPFILE files have no directory entry and vanish on close
+    if not path.startswith('/proc/'):
+        os.unlink(path)
 
 def test_parser():
     """Test the SCAP parser functionality"""
     print("Testing SCAP parser...")
     
     try:
-        from scap_prometheus_exporter import SCAPParser
-        
-        # Create sample results file
-        results_file = create_sample_scap_results()
+        from scap_prometheus_exporter import SCAPParser, LXML_AVAILABLE
         
         # Test parsing
         parser = SCAPParser()
-        result = parser.parse_results(results_file, "test-server")
+        result = parser.parse_results_bytes(SAMPLE_XML_BYTES, "test-server")
+        
+        # The file entry point must agree with the in-memory one
+        fd, results_file = _write_sample(SAMPLE_XML_BYTES)
+        try:
+            from_file = parser.parse_results(results_file, "test-server")
+        finally:
+            _remove_sample(fd, results_file)
+        
+        if result and from_file != result:
+            print("❌ Parser test failed - file and bytes results differ")
+            return False
+        
+        # Both layouts must produce the known counts on this backend...
+        problems = _check_sample_results()
+        
+        # ...and on the stdlib fallback used wherever lxml is not installed
+        if LXML_AVAILABLE:
+            fallback = subprocess.run(
+                [sys.executable, '-c', _STDLIB_CHECK],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                capture_output=True, text=True
+            )
+            if fallback.returncode != 0:
+                problems.extend(f"stdlib: {line}" for line in
+                                (fallback.stdout + fallback.stderr).splitlines() if line)
         
-        # Cleanup
-        os.unlink(results_file)
+        if problems:
+            print("❌ Parser test failed - unexpected results:")
+            for problem in problems:
+                print(f"   {problem}")
+            return False
         
         if result:
             print(f"✅ Parser test passed!")
@@ -121,30 +269,79 @@ def test_parser():
         print(f"❌ Parser test failed: {e}")
         return False
 
+def test_timestamp_parsing():
+    """Test conversion of SCAP start times to epoch seconds"""
+    print("Testing timestamp parsing...")
+    
+    try:
+        from scap_prometheus_exporter import SCAPParser
+        
+        noon_utc = 1704110400.0  # 2024-01-01T12:00:00Z
+        cases = [
+            ('2024-01-01T12:00:00Z', noon_utc),
+            ('2024-01-01T14:30:00+02:30', noon_utc),
+            ('2024-01-01T07:00:00-05:00', noon_utc),
+            ('2024-01-01T12:00:00.250Z', noon_utc + 0.25),
+            # Naive timestamps are taken as local time
+            ('2024-01-01T12:00:00', datetime(2024, 1, 1, 12).timestamp()),
+        ]
+        
+        failures = []
+        for text, expected in cases:
+            try:
+                actual = SCAPParser._parse_timestamp(text)
+            except ValueError as e:
+                failures.append(f"{text} raised {e}")
+                continue
+            if abs(actual - expected) > 1e-6:
+                failures.append(f"{text} parsed as {actual}, expected {expected}")
+        
+        # Impossible dates must be rejected, not rolled over into March
+        try:
+            actual = SCAPParser._parse_timestamp('2024-02-30T12:00:00Z')
+            failures.append(f"2024-02-30T12:00:00Z parsed as {actual}")
+        except ValueError:
+            pass
+        
+        if failures:
+            print(f"❌ Timestamp parsing test failed - {'; '.join(failures)}")
+            return False
+        
+        print("✅ Timestamp parsing test passed!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Timestamp parsing test failed: {e}")
+        return False
+
 def test_prometheus_export():
     """Test Prometheus metrics export"""
     print("Testing Prometheus export...")
     
     try:
-        from scap_prometheus_exporter import SCAPParser, PrometheusExporter
-        from prometheus_client import generate_latest
-        
-        # Create sample results and parse
-        results_file = create_sample_scap_results()
-        parser = SCAPParser()
-        result = parser.parse_results(results_file, "test-server")
-        os.unlink(results_file)
+        # Only the exporter is under test here; reuse the parsed sample
+        result = _get_sample_result()
         
         if not result:
             print("❌ No result to export")
             return False
         
         # Create exporter and update metrics
-        exporter = PrometheusExporter()
+        exporter = _new_exporter()
         exporter.update_metrics(result)
         
         # Generate metrics output
-        metrics_output = generate_latest(exporter.registry).decode()
+        metrics_bytes = exporter.generate_metrics()
+        
+        # Scrapes between updates must reuse the cached rendering
+        if exporter.generate_metrics() is not metrics_bytes:
+            print("❌ Metrics were re-rendered without an update")
+            return False
+        
+        exporter.update_metrics(result)
+        if exporter.generate_metrics() is metrics_bytes:
+            print("❌ Cached metrics were served after an update")
+            return False
         
         # Check for expected metrics
         expected_metrics = [
@@ -154,79 +351,191 @@ def test_prometheus_export():
             'scap_failed_rules_by_severity'
         ]
         
-        missing_metrics = []
-        for metric in expected_metrics:
-            if metric not in metrics_output:
-                missing_metrics.append(metric)
+        # Metric names of every sample line, collected in one pass over the
+        # raw exposition bytes
+        metric_names = {line.split(b'{', 1)[0].split(b' ', 1)[0]
+                        for line in metrics_bytes.splitlines()
+                        if line and not line.startswith(b'#')}
+        missing_metrics = [metric for metric in expected_metrics
+                           if metric.encode() not in metric_names]
         
         if missing_metrics:
             print(f"❌ Missing metrics: {missing_metrics}")
             return False
         
+        line_count = metrics_bytes.count(b'\n')
         print("✅ Prometheus export test passed!")
-        print(f"   Generated {len(metrics_output.splitlines())} lines of metrics")
+        print(f"   Generated {line_count} lines of metrics")
         return True
         
     except Exception as e:
         print(f"❌ Prometheus export test failed: {e}")
         return False
 
+def test_unchanged_scan_skip():
+    """Test that identical scan results are not parsed or exported twice"""
+    print("Testing unchanged scan skip...")
+    
+    try:
+        import time
+        from prometheus_client import CollectorRegistry
+        from scap_prometheus_exporter import SCAPExporterDaemon
+        
+        fd, config_file = _write_sample(b'hostname: test-server\n')
+        try:
+            daemon = SCAPExporterDaemon(config_file, CollectorRegistry())
+        finally:
+            _remove_sample(fd, config_file)
+        
+        # Every "scan" writes the same results to a fresh temporary file
+        scanned_files = []
+        def fake_scan(profile, content_file=None):
+            fd, path = tempfile.mkstemp(suffix='.xml', prefix='test_scap_results_')
+            os.write(fd, SAMPLE_XML_BYTES)
+            os.close(fd)
+            scanned_files.append(path)
+            return path
+        daemon.scanner.scan = fake_scan
+        
+        updates = []
+        update_metrics = daemon.exporter.update_metrics
+        def counting_update(result):
+            updates.append(result)
+            update_metrics(result)
+        daemon.exporter.update_metrics = counting_update
+        
+        expected = EXPECTED_SAMPLE_RESULT
+        labels = {'hostname': expected['hostname'], 'profile': expected['profile'],
+                  'benchmark': expected['benchmark_id']}
+        def last_scan():
+            return daemon.exporter.registry.get_sample_value('scap_last_scan_timestamp_seconds', labels)
+        
+        failures = []
+        daemon.scan_and_update(expected['profile'])
+        if last_scan() != expected['scan_time']:
+            failures.append(f"first scan recorded timestamp {last_scan()}")
+        
+        before_rescan = time.time()
+        daemon.scan_and_update(expected['profile'])
+        if len(updates) != 1:
+            failures.append(f"metrics were updated {len(updates)} times for identical results")
+        if not (last_scan() or 0) >= before_rescan:
+            failures.append(f"unchanged rescan left the timestamp at {last_scan()}")
+        
+        # A results file that cannot be hashed must still be removed
+        def unreadable(path):
+            raise OSError("simulated read error")
+        daemon._file_digest = unreadable
+        daemon.scan_and_update(expected['profile'])
+        
+        leftover = [path for path in scanned_files if os.path.exists(path)]
+        if leftover:
+            failures.append(f"temporary results files left behind: {leftover}")
+        if len(updates) != 1:
+            failures.append("metrics were updated after a failed digest")
+        
+        if failures:
+            print(f"❌ Unchanged scan skip test failed - {'; '.join(failures)}")
+            return False
+        
+        print("✅ Unchanged scan skip test passed!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Unchanged scan skip test failed: {e}")
+        return False
+
 def test_http_server():
     """Test HTTP server functionality"""
     print("Testing HTTP server...")
     
     try:
+        import gzip
+        import http.client
+        import socket
         import threading
         import time
-        import requests
-        from scap_prometheus_exporter import PrometheusExporter, MetricsHTTPHandler
-        from http.server import HTTPServer
-        from prometheus_client import CollectorRegistry
+        from scap_prometheus_exporter import MetricsHTTPHandler, MetricsHTTPServer
         
-        # Create separate registry to avoid conflicts
-        registry = CollectorRegistry()
-        exporter = PrometheusExporter(registry)
+        exporter = _new_exporter()
+        exporter.update_metrics(_get_sample_result())
         
         # Start simple HTTP server for test
         def handler_factory(*args, **kwargs):
             return MetricsHTTPHandler(exporter, *args, **kwargs)
         
-        server = HTTPServer(('', 9156), handler_factory)
-        
-        def serve():
-            server.timeout = 0.1  # Short timeout to allow shutdown
-            while True:
-                try:
-                    server.handle_request()
-                except:
-                    break
-        
-        thread = threading.Thread(target=serve, daemon=True)
+        # The exporter's own server class: keep-alive connections hold
+        # their handler thread between requests
+        server = MetricsHTTPServer(('', 9156), handler_factory)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
         thread.start()
         
-        # Give server time to start
-        time.sleep(0.5)
-        
-        # Test endpoints
         try:
-            health_response = requests.get('http://localhost:9156/health', timeout=5)
-            metrics_response = requests.get('http://localhost:9156/metrics', timeout=5)
+            # Wait until the server accepts connections
+            with socket.socket() as probe:
+                deadline = time.monotonic() + 5
+                while probe.connect_ex(('localhost', 9156)):
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("server did not start listening")
+                    time.sleep(0.005)
             
-            if health_response.status_code == 200 and metrics_response.status_code == 200:
-                print("✅ HTTP server test passed!")
-                print(f"   Health endpoint: {health_response.status_code}")
-                print(f"   Metrics endpoint: {metrics_response.status_code}")
-                success = True
-            else:
-                print(f"❌ HTTP server test failed - status codes: {health_response.status_code}, {metrics_response.status_code}")
-                success = False
+            # Test endpoints
+            # All probes share one keep-alive connection
+            conn = http.client.HTTPConnection('localhost', 9156, timeout=5)
+            try:
+                def get(path, headers=None):
+                    conn.request('GET', path, headers=headers or {})
+                    response = conn.getresponse()
+                    return response, response.read()
                 
-        except requests.exceptions.RequestException as e:
-            print(f"❌ HTTP server test failed - request error: {e}")
-            success = False
-        
-        # Cleanup
-        server.server_close()
+                health_response, _ = get('/health')
+                metrics_response, metrics_body = get('/metrics')
+                gzip_response, gzip_body = get('/metrics', {'Accept-Encoding': 'gzip'})
+                refused_response, refused_body = get('/metrics', {'Accept-Encoding': 'identity, gzip;q=0'})
+                expected_metrics = exporter.generate_metrics()
+                
+                failures = []
+                for name, response, body in (('health', health_response, None),
+                                             ('metrics', metrics_response, metrics_body),
+                                             ('gzip metrics', gzip_response, gzip_body),
+                                             ('gzip-refusing metrics', refused_response, refused_body)):
+                    if response.status != 200:
+                        failures.append(f"{name} status {response.status}")
+                    if body is not None and response.getheader('Vary') != 'Accept-Encoding':
+                        failures.append(f"{name} Vary is {response.getheader('Vary')!r}")
+                    if body is not None and response.getheader('Content-Length') != str(len(body)):
+                        failures.append(f"{name} Content-Length {response.getheader('Content-Length')} "
+                                        f"for a {len(body)} byte body")
+                if metrics_body != expected_metrics:
+                    failures.append("metrics body differs from generate_metrics()")
+                if metrics_response.getheader('Content-Encoding') is not None:
+                    failures.append("uncompressed metrics sent with a Content-Encoding")
+                if refused_response.getheader('Content-Encoding') is not None or refused_body != expected_metrics:
+                    failures.append("gzip;q=0 client was sent a compressed body")
+                if gzip_response.getheader('Content-Encoding') != 'gzip':
+                    failures.append(f"gzip metrics Content-Encoding is {gzip_response.getheader('Content-Encoding')!r}")
+                elif gzip.decompress(gzip_body) != expected_metrics:
+                    failures.append("decompressed metrics differ from generate_metrics()")
+                
+                if not failures:
+                    print("✅ HTTP server test passed!")
+                    print(f"   Health endpoint: {health_response.status}")
+                    print(f"   Metrics endpoint: {metrics_response.status} "
+                          f"({len(metrics_body)} bytes, {len(gzip_body)} gzipped)")
+                    success = True
+                else:
+                    print(f"❌ HTTP server test failed - {'; '.join(failures)}")
+                    success = False
+                    
+            except (OSError, http.client.HTTPException) as e:
+                print(f"❌ HTTP server test failed - request error: {e}")
+                success = False
+            finally:
+                conn.close()
+        finally:
+            # Cleanup
+            server.shutdown()
+            server.server_close()
         
         return success
             
@@ -234,6 +543,14 @@ def test_http_server():
         print(f"❌ HTTP server test failed: {e}")
         return False
 
+def _safe_run(test):
+    """Run a test function, counting an escaped exception as a failure"""
+    try:
+        return bool(test())
+    except Exception as e:
+        print(f"❌ Test {test.__name__} failed with exception: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("SCAP Prometheus Exporter Test Suite")
@@ -241,23 +558,20 @@ def main():
     
     tests = [
         test_parser,
+        test_timestamp_parsing,
         test_prometheus_export,
+        test_unchanged_scan_skip,
         test_http_server
     ]
     
-    passed = 0
-    failed = 0
+    # The tests share no state (each builds its own registry and the HTTP
+    # test owns its port), so run them side by side
+    with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+        results = list(executor.map(_safe_run, tests))
+    print()
     
-    for test in tests:
-        try:
-            if test():
-                passed += 1
-            else:
-                failed += 1
-        except Exception as e:
-            print(f"❌ Test {test.__name__} failed with exception: {e}")
-            failed += 1
-        print()
+    passed = sum(results)
+    failed = len(results) - passed
     
     print("Test Summary")
     print("============")